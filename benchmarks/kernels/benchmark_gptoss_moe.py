@@ -8,10 +8,131 @@ from __future__ import annotations
 
 import argparse
 import json
+import re
+import statistics
 import subprocess
 import sys
+import threading
+import time
 from pathlib import Path
 
+try:
+    # Optional: google-re2 matches in linear time regardless of log size or
+    # pattern count; stdlib re is the fallback. re2.compile takes no re-style
+    # flag integers, so case-insensitivity lives inline in the pattern.
+    import re2 as _regex
+except ImportError:
+    _regex = re
+
+try:
+    # Optional: serializes straight to bytes, ~5x faster than stdlib json
+    import orjson
+except ImportError:
+    orjson = None
+
+TAIL_CHARS = 1200
+
+# Number of recent history entries the regression baseline is computed over
+HISTORY_WINDOW = 20
+
+# Fallback text-metric patterns, scanned per line while the child is still
+# running. The `--json` payload stays authoritative; these only fill metrics
+# when the payload is missing or truncated. Both metrics live in a single
+# alternation so each line is scanned once, not once per metric.
+COMBINED_METRIC_PATTERN = _regex.compile(
+    r"(?i)(?:first token\s*:?\s*(?P<first_token_ms>[0-9]+(?:\.[0-9]+)?)\s*ms)"
+    r"|(?:generated\s*:?\s*[0-9]+\s*tokens\s*\((?P<tokens_per_s>[0-9]+(?:\.[0-9]+)?)\s*tok/s\))"
+)
+
+
+def scan_metric_line(line: str, metrics: dict) -> None:
+    for match in COMBINED_METRIC_PATTERN.finditer(line):
+        for key, value in match.groupdict().items():
+            if value is not None and metrics.get(key) is None:
+                metrics[key] = float(value)
+
+
+def run_bench(cmd: list[str]) -> tuple[int, str, str, dict]:
+    """Run the bench child with line-buffered pipes, scanning stdout as lines arrive.
+
+    stderr stays on its own pipe, drained by a thread so neither stream can
+    block the child; its noise (npm warnings, console.error braces) must never
+    reach the JSON payload parse, which reads stdout alone.
+    """
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        bufsize=1,
+    )
+    stderr_lines: list[str] = []
+    drain = threading.Thread(target=lambda: stderr_lines.extend(proc.stderr), daemon=True)
+    drain.start()
+    stdout_lines: list[str] = []
+    text_metrics: dict = {}
+    for line in proc.stdout:
+        stdout_lines.append(line)
+        scan_metric_line(line, text_metrics)
+    returncode = proc.wait()
+    drain.join()
+    return returncode, "".join(stdout_lines), "".join(stderr_lines), text_metrics
+
+
+def dump_payload(payload: dict) -> bytes:
+    """Serialize the summary once, as indented JSON bytes ending in a newline."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(payload, indent=2) + "\n").encode("utf-8")
+
+
+def dump_history_line(entry: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(entry, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(entry) + "\n").encode("utf-8")
+
+
+def load_history(path: Path) -> list[dict]:
+    """Read history entries from a JSONL file, skipping unparseable lines."""
+    if not path.exists():
+        return []
+    entries = []
+    with path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(entry, dict):
+                entries.append(entry)
+    return entries
+
+
+def check_regression(history: list[dict], current: float | None, threshold: float) -> str | None:
+    """Compare current decode throughput against the rolling median baseline.
+
+    Returns a failure message when the current value is more than `threshold`
+    (fractional) below the median of the prior runs, else None.
+    """
+    if threshold <= 0 or current is None:
+        return None
+    prior = [
+        entry.get("decode_tokens_per_s")
+        for entry in history
+        if isinstance(entry.get("decode_tokens_per_s"), (int, float))
+    ]
+    if not prior:
+        return None
+    baseline = statistics.median(prior)
+    floor = (1.0 - threshold) * baseline
+    if current < floor:
+        return (
+            f"decode_tokens_per_s {current:.2f} is below {floor:.2f} "
+            f"({threshold:.0%} under median {baseline:.2f} of last {len(prior)} runs)"
+        )
+    return None
+
+
 def parse_json_payload(output: str) -> dict | None:
     text = (output or "").strip()
     if not text:
@@ -40,6 +161,14 @@ def main() -> int:
     parser.add_argument("--prompt", default="short")
     parser.add_argument("--max-tokens", type=int, default=64)
     parser.add_argument("--output", default="benchmarks/kernels/gptoss_moe_latest.json")
+    parser.add_argument("--history", default="benchmarks/kernels/gptoss_moe_history.jsonl")
+    parser.add_argument(
+        "--regression-threshold",
+        type=float,
+        default=0.10,
+        help="Fail (exit 2) if decode tok/s is more than this fraction below "
+        "the median of recent history for the same model/profile; 0 disables",
+    )
     args = parser.parse_args()
 
     cmd = [
@@ -63,9 +192,8 @@ def main() -> int:
         "--json",
     ]
 
-    proc = subprocess.run(cmd, capture_output=True, text=True)
-    output = (proc.stdout or "") + "\n" + (proc.stderr or "")
-    parsed = parse_json_payload(proc.stdout or "")
+    returncode, stdout, stderr, text_metrics = run_bench(cmd)
+    parsed = parse_json_payload(stdout)
     bench_result = parsed.get("result") if isinstance(parsed, dict) else None
     bench_metrics = bench_result.get("metrics") if isinstance(bench_result, dict) else {}
 
@@ -75,28 +203,69 @@ def main() -> int:
         "prefill_tokens_per_s": bench_metrics.get("prefillTokensPerSec"),
         "model_load_ms": bench_metrics.get("modelLoadMs"),
     }
+    if metrics["first_token_ms"] is None:
+        metrics["first_token_ms"] = text_metrics.get("first_token_ms")
+    if metrics["decode_tokens_per_s"] is None:
+        metrics["decode_tokens_per_s"] = text_metrics.get("tokens_per_s")
+
+    # Compare against prior successful runs of the same model/profile before
+    # this run is appended to the history. Failed runs are recorded but never
+    # enter the baseline, and a failed run is never itself flagged as a
+    # regression -- its real exit code must surface.
+    history_path = Path(args.history)
+    history = [
+        entry
+        for entry in load_history(history_path)
+        if entry.get("model") == args.model
+        and entry.get("runtimeProfile") == args.runtime_profile
+        and entry.get("returnCode") == 0
+    ][-HISTORY_WINDOW:]
+    regression = None
+    if returncode == 0:
+        regression = check_regression(
+            history, metrics["decode_tokens_per_s"], args.regression_threshold
+        )
 
     payload = {
-        "schemaVersion": 1,
+        "schemaVersion": 2,
         "model": args.model,
         "runtimeProfile": args.runtime_profile,
         "prompt": args.prompt,
         "maxTokens": args.max_tokens,
         "command": cmd,
-        "returnCode": proc.returncode,
+        "returnCode": returncode,
         "metrics": metrics,
         "parseError": None if parsed is not None else "failed to parse bench JSON output",
         "benchResult": bench_result if isinstance(bench_result, dict) else None,
-        "stdoutTail": (proc.stdout or "")[-1200:],
-        "stderrTail": (proc.stderr or "")[-1200:],
+        "regression": regression,
+        "stdoutTail": stdout[-TAIL_CHARS:],
+        "stderrTail": stderr[-TAIL_CHARS:],
     }
 
+    # Serialize once; reuse the bytes for the file and for stdout
+    payload_bytes = dump_payload(payload)
     out_path = Path(args.output)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+    out_path.write_bytes(payload_bytes)
+
+    history_entry = {
+        "ts": time.time(),
+        "model": args.model,
+        "runtimeProfile": args.runtime_profile,
+        "prompt": args.prompt,
+        "maxTokens": args.max_tokens,
+        "returnCode": returncode,
+        **metrics,
+    }
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    with history_path.open("ab") as handle:
+        handle.write(dump_history_line(history_entry))
 
-    print(json.dumps(payload, indent=2))
-    return proc.returncode
+    sys.stdout.buffer.write(payload_bytes)
+    if regression is not None:
+        print(f"REGRESSION: {regression}", file=sys.stderr)
+        return 2
+    return returncode
 
 
 if __name__ == "__main__":
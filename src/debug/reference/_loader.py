@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Shared lazy model loader for the reference debug scripts.
+
+Memoizes model/config loads so a diffing loop that re-runs these scripts
+against the same checkpoint pays the multi-GB weight load once per
+(model, dtype) instead of once per invocation.
+"""
+
+import functools
+
+import torch
+from transformers import AutoConfig, AutoModelForCausalLM
+
+DTYPES = {
+    "fp32": torch.float32,
+    "bf16": torch.bfloat16,
+    "fp16": torch.float16,
+}
+
+
+def config_dtype(config, default="bf16"):
+    """Read the optional "dtype" config key, defaulting to bf16."""
+    value = config.get("dtype", default)
+    if value not in DTYPES:
+        raise SystemExit(f'Config "dtype" must be one of: {", ".join(DTYPES)}')
+    return value
+
+
+@functools.lru_cache(maxsize=2)
+def load_model(model_id, dtype="bf16"):
+    """Load a CPU model once per (model_id, dtype) and cache it."""
+    if dtype not in DTYPES:
+        raise SystemExit(f'Unknown dtype "{dtype}" (expected one of: {", ".join(DTYPES)})')
+    return AutoModelForCausalLM.from_pretrained(
+        model_id,
+        torch_dtype=DTYPES[dtype],
+        device_map="cpu",
+        low_cpu_mem_usage=True,
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def load_hf_config(model_id):
+    """Load only the model config -- no weight shards are touched."""
+    return AutoConfig.from_pretrained(model_id)
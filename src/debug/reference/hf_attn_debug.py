@@ -11,16 +11,24 @@ Config (JSON):
     {
       "model": "google/gemma-2-2b-it",
       "prompt": "The color of the sky is",
-      "layer": 0
+      "layer": 0,
+      "dtype": "bf16"
     }
 
+"dtype" is optional: bf16 (default), fp16, or fp32. The kept modules are
+cast to fp32 after loading, so dtype only affects weight-loading I/O and
+the precision the checkpoint is read at.
+
 Requires: pip install torch transformers
 """
 
+import gc
 import json
 import sys
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoTokenizer
+
+from _loader import config_dtype, load_model
 
 
 def load_config():
@@ -53,9 +61,10 @@ def main():
     model_id = require_string(config, "model")
     prompt = require_string(config, "prompt")
     layer_index = require_int(config, "layer")
+    dtype = config_dtype(config)
 
-    print(f"Loading model: {model_id}")
-    model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=torch.float32, device_map="cpu")
+    print(f"Loading model: {model_id} ({dtype})")
+    model = load_model(model_id, dtype)
     tokenizer = AutoTokenizer.from_pretrained(model_id)
 
     inputs = tokenizer(prompt, return_tensors="pt")
@@ -77,21 +86,33 @@ def main():
     layer = model.model.layers[layer_index]
     attn = layer.self_attn
 
+    # Keep only the modules this script evaluates (embed -> norm -> Q/K/V)
+    # at fp32 and free the rest of the model before running them, so peak
+    # RSS is a handful of modules instead of every decoder layer.
+    embed_tokens = model.model.embed_tokens.float()
+    input_layernorm = layer.input_layernorm.float()
+    q_proj = attn.q_proj.float()
+    k_proj = attn.k_proj.float()
+    v_proj = attn.v_proj.float()
+    del model, layer, attn
+    load_model.cache_clear()
+    gc.collect()
+
     # Get scaled embeddings as input
-    raw_embeddings = model.model.embed_tokens(input_ids)
+    raw_embeddings = embed_tokens(input_ids)
     hidden_states = raw_embeddings * (config.hidden_size ** 0.5)
     print(f"\nInput hidden states (last token first 8): {hidden_states[0, -1, :8].tolist()}")
 
     # Apply input norm
-    normed = layer.input_layernorm(hidden_states)
+    normed = input_layernorm(hidden_states)
     print(f"After input_norm (last token first 8): {normed[0, -1, :8].tolist()}")
     print(f"After input_norm (token 0 first 8): {normed[0, 0, :8].tolist()}")
 
     # Q, K, V projections
     with torch.no_grad():
-        q = attn.q_proj(normed)
-        k = attn.k_proj(normed)
-        v = attn.v_proj(normed)
+        q = q_proj(normed)
+        k = k_proj(normed)
+        v = v_proj(normed)
 
     print(f"\nQ projection (last token first 8): {q[0, -1, :8].tolist()}")
     print(f"K projection (last token first 8): {k[0, -1, :8].tolist()}")
@@ -101,13 +122,14 @@ def main():
     print(f"K projection (token 0 first 8): {k[0, 0, :8].tolist()}")
     print(f"V projection (token 0 first 8): {v[0, 0, :8].tolist()}")
 
-    # Check for errors vs expected
+    # Check for errors vs expected: reduce across the sequence in one kernel
+    # per projection instead of three kernels plus a sync per token
     print(f"\nPer-token maxAbs:")
-    for t in range(num_tokens):
-        q_max = q[0, t].abs().max().item()
-        k_max = k[0, t].abs().max().item()
-        v_max = v[0, t].abs().max().item()
-        print(f"  Token {t}: Q_maxAbs={q_max:.4f}, K_maxAbs={k_max:.4f}, V_maxAbs={v_max:.4f}")
+    q_max = q[0].abs().amax(dim=-1).tolist()
+    k_max = k[0].abs().amax(dim=-1).tolist()
+    v_max = v[0].abs().amax(dim=-1).tolist()
+    for t, (qm, km, vm) in enumerate(zip(q_max, k_max, v_max)):
+        print(f"  Token {t}: Q_maxAbs={qm:.4f}, K_maxAbs={km:.4f}, V_maxAbs={vm:.4f}")
 
 
 if __name__ == "__main__":
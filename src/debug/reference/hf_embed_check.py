@@ -8,16 +8,21 @@ Usage:
 Config (JSON):
     {
       "model": "google/gemma-2-2b-it",
-      "prompt": "The color of the sky is"
+      "prompt": "The color of the sky is",
+      "dtype": "bf16"
     }
 
+"dtype" is optional: bf16 (default), fp16, or fp32.
+
 Requires: pip install torch transformers
 """
 
 import json
 import sys
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoTokenizer
+
+from _loader import config_dtype, load_model
 
 
 def load_config():
@@ -42,9 +47,10 @@ def main():
     config = load_config()
     model_id = require_string(config, "model")
     prompt = require_string(config, "prompt")
+    dtype = config_dtype(config)
 
-    print(f"Loading model: {model_id}")
-    model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=torch.float32, device_map="cpu")
+    print(f"Loading model: {model_id} ({dtype})")
+    model = load_model(model_id, dtype)
     tokenizer = AutoTokenizer.from_pretrained(model_id)
 
     inputs = tokenizer(prompt, return_tensors="pt")
@@ -69,20 +75,25 @@ def main():
     def hook_layer0_output(module, input, output):
         layer0_outputs['output'] = output[0].detach()
 
-    model.model.layers[0].register_forward_hook(hook_layer0_output)
-
-    # Run forward pass
-    with torch.no_grad():
-        outputs = model(input_ids, output_hidden_states=True)
+    # Run forward pass. The hook alone captures layer 0; asking for
+    # output_hidden_states would make HF stash every layer's hidden state.
+    # try/finally keeps hooks from accumulating across repeated runs.
+    handle = model.model.layers[0].register_forward_hook(hook_layer0_output)
+    try:
+        with torch.no_grad():
+            model(input_ids)
+    finally:
+        handle.remove()
 
     print(f"\nLayer 0 output (last token first 5): {layer0_outputs['output'][0, -1, :5].tolist()}")
 
-    # Per-token comparison
+    # Per-token comparison: one batched reduction per tensor instead of two
+    # kernels plus a Python sync per token
     print(f"\nPer-token maxAbs comparison:")
-    for t in range(inputs['input_ids'].shape[1]):
-        emb_max = scaled_embeddings[0, t].abs().max().item()
-        l0_max = layer0_outputs['output'][0, t].abs().max().item()
-        print(f"  Token {t}: emb_maxAbs={emb_max:.2f}, L0_maxAbs={l0_max:.2f}")
+    emb_max = scaled_embeddings[0].abs().amax(dim=-1).tolist()
+    l0_max = layer0_outputs['output'][0].abs().amax(dim=-1).tolist()
+    for t, (e_max, l_max) in enumerate(zip(emb_max, l0_max)):
+        print(f"  Token {t}: emb_maxAbs={e_max:.2f}, L0_maxAbs={l_max:.2f}")
 
 
 if __name__ == "__main__":
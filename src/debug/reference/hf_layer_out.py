@@ -10,16 +10,25 @@ Config (JSON):
       "model": "google/gemma-2-2b-it",
       "prompt": "The color of the sky is",
       "layers": [0, 12, 25],
-      "token": -1
+      "token": -1,
+      "dtype": "bf16"
     }
 
+"dtype" is optional: bf16 (default), fp16, or fp32.
+
 Requires: pip install torch transformers
 """
 
 import json
 import sys
+import numpy as np
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoTokenizer
+
+from _loader import config_dtype, load_model
+
+# Format printed rows in one C-level pass instead of a per-element f-string
+np.set_printoptions(precision=4, suppress=True, floatmode="fixed")
 
 
 def main():
@@ -46,11 +55,12 @@ def main():
         raise SystemExit('Config "layers" entries must be integers')
     if not isinstance(token, int):
         raise SystemExit('Config "token" must be an integer')
+    dtype = config_dtype(config)
 
     layer_indices = layers
 
-    print(f"Loading model: {model_id}")
-    model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=torch.float32, device_map="cpu")
+    print(f"Loading model: {model_id} ({dtype})")
+    model = load_model(model_id, dtype)
     tokenizer = AutoTokenizer.from_pretrained(model_id)
 
     inputs = tokenizer(prompt, return_tensors="pt")
@@ -62,38 +72,56 @@ def main():
     print(f"Token IDs: {input_ids[0].tolist()}")
     print(f"Checking token index: {token_idx}")
 
-    # Run forward pass with hidden states
-    with torch.no_grad():
-        outputs = model(input_ids, output_hidden_states=True)
-
-    hidden_states = outputs.hidden_states  # Tuple of [batch, seq, hidden]
-    print(f"\nNum hidden states: {len(hidden_states)} (embed + {len(hidden_states)-1} layers)")
+    num_layers = len(model.model.layers)
+    print(f"\nNum layers: {num_layers}")
+
+    # Hook only the requested layers instead of output_hidden_states=True,
+    # so retained activations scale with len(layers) rather than model depth.
+    captured = {}
+    handles = []
+
+    def make_hook(layer_idx):
+        def hook(module, input, output):
+            captured[layer_idx] = output[0].detach()
+        return hook
+
+    try:
+        for layer_idx in layer_indices:
+            if 0 <= layer_idx < num_layers:
+                handles.append(
+                    model.model.layers[layer_idx].register_forward_hook(make_hook(layer_idx))
+                )
+        with torch.no_grad():
+            model(input_ids)
+    finally:
+        for handle in handles:
+            handle.remove()
 
     for layer_idx in layer_indices:
-        if layer_idx >= len(hidden_states) - 1:
+        if layer_idx not in captured:
             print(f"\nLayer {layer_idx}: OUT OF RANGE")
             continue
 
-        # hidden_states[0] = embeddings, hidden_states[1] = layer 0 output, etc.
-        hs = hidden_states[layer_idx + 1]  # +1 because index 0 is embeddings
+        hs = captured[layer_idx]
 
-        vals = hs[0, token_idx, :8].tolist()
-        max_abs = hs[0, token_idx].abs().max().item()
-        mean_abs = hs[0, token_idx].abs().mean().item()
+        vals = hs[0, token_idx, :8].float().numpy()
+        token_abs = hs[0, token_idx].abs()
+        max_abs = torch.aminmax(token_abs).max.item()
+        mean_abs = token_abs.mean().item()
 
         print(f"\nLayer {layer_idx} output (token {token_idx}):")
-        print(f"  First 8: {[f'{v:.4f}' for v in vals]}")
+        print(f"  First 8: {vals}")
         print(f"  maxAbs: {max_abs:.4f}, meanAbs: {mean_abs:.4f}")
 
     # Also show BOS (token 0) for comparison
     print(f"\n--- BOS Token (position 0) for reference ---")
     for layer_idx in layer_indices:
-        if layer_idx >= len(hidden_states) - 1:
+        if layer_idx not in captured:
             continue
-        hs = hidden_states[layer_idx + 1]
-        vals = hs[0, 0, :8].tolist()
-        max_abs = hs[0, 0].abs().max().item()
-        print(f"Layer {layer_idx} (BOS): first8={[f'{v:.4f}' for v in vals]}, maxAbs={max_abs:.4f}")
+        hs = captured[layer_idx]
+        vals = hs[0, 0, :8].float().numpy()
+        max_abs = torch.aminmax(hs[0, 0].abs()).max.item()
+        print(f"Layer {layer_idx} (BOS): first8={vals}, maxAbs={max_abs:.4f}")
 
 
 if __name__ == "__main__":
@@ -2,6 +2,9 @@
 """
 Dump weight values for Q/K/V/O projections from HuggingFace model.
 
+Reads the projection slices straight out of the checkpoint's safetensors
+shards instead of materializing the full model.
+
 Usage:
     python hf_weights.py <config.json>
 
@@ -17,8 +20,29 @@ Requires: pip install torch transformers
 
 import json
 import sys
-import torch
-from transformers import AutoModelForCausalLM
+
+from huggingface_hub import hf_hub_download
+from huggingface_hub.utils import EntryNotFoundError
+from safetensors import safe_open
+
+
+def resolve_shards(model_id, keys):
+    """Map each tensor key to the local shard file that holds it."""
+    try:
+        index_path = hf_hub_download(model_id, "model.safetensors.index.json")
+    except EntryNotFoundError:
+        # Single-shard checkpoint: every key lives in the one file
+        shard_path = hf_hub_download(model_id, "model.safetensors")
+        return {key: shard_path for key in keys}
+    with open(index_path, "r", encoding="utf-8") as handle:
+        weight_map = json.load(handle).get("weight_map", {})
+    shards = {}
+    for key in keys:
+        shard_name = weight_map.get(key)
+        if shard_name is None:
+            raise SystemExit(f'Tensor "{key}" not found in safetensors index')
+        shards[key] = hf_hub_download(model_id, shard_name)
+    return shards
 
 
 def main():
@@ -41,34 +65,38 @@ def main():
     if proj not in ["q", "k", "v", "o", "all"]:
         raise SystemExit('Config "proj" must be one of: q, k, v, o, all')
 
-    print(f"Loading model: {model_id}")
-    model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=torch.float32, device_map="cpu")
-
-    layer = model.model.layers[layer_index]
-    attn = layer.self_attn
-
-    projections = {
-        "q": attn.q_proj,
-        "k": attn.k_proj,
-        "v": attn.v_proj,
-        "o": attn.o_proj,
+    projs_to_show = ["q", "k", "v", "o"] if proj == "all" else [proj]
+    keys = {
+        name: f"model.layers.{layer_index}.self_attn.{name}_proj.weight"
+        for name in projs_to_show
     }
 
-    projs_to_show = list(projections.keys()) if proj == "all" else [proj]
+    print(f"Resolving safetensors shards: {model_id}")
+    shards = resolve_shards(model_id, keys.values())
 
     for name in projs_to_show:
-        proj = projections[name]
-        weight = proj.weight.data  # [out_features, in_features]
-
-        print(f"\n{name.upper()}_proj weight shape: {weight.shape}")
-        print(f"{name.upper()}_proj weight[0, :8] (first row, first 8 cols):")
-        print(f"  {weight[0, :8].tolist()}")
-        print(f"{name.upper()}_proj weight[:8, 0] (first 8 rows, first col):")
-        print(f"  {weight[:8, 0].tolist()}")
-
-        # Some specific indices for comparison
-        if weight.shape[1] > 100:
-            print(f"{name.upper()}_proj weight[0, 100]: {weight[0, 100].item():.6f}")
+        key = keys[name]
+        with safe_open(shards[key], framework="pt", device="cpu") as shard:
+            if key not in shard.keys():
+                raise SystemExit(f'Tensor "{key}" not found in {shards[key]}')
+
+            # get_slice reads only the requested elements from the shard;
+            # the full weight matrix is never materialized
+            weight = shard.get_slice(key)
+            shape = weight.get_shape()  # [out_features, in_features]
+            first_row = weight[0:1, 0:8][0]
+            first_col = weight[0:8, 0:1][:, 0]
+
+            print(f"\n{name.upper()}_proj weight shape: {list(shape)}")
+            print(f"{name.upper()}_proj weight[0, :8] (first row, first 8 cols):")
+            print(f"  {first_row.float().tolist()}")
+            print(f"{name.upper()}_proj weight[:8, 0] (first 8 rows, first col):")
+            print(f"  {first_col.float().tolist()}")
+
+            # Some specific indices for comparison
+            if shape[1] > 100:
+                value = weight[0:1, 100:101][0, 0].float().item()
+                print(f"{name.upper()}_proj weight[0, 100]: {value:.6f}")
 
 
 if __name__ == "__main__":